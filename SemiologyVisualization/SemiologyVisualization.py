@@ -1,5 +1,6 @@
 import csv
 import logging
+import tempfile
 from pathlib import Path
 from abc import ABC, abstractmethod
 
@@ -17,6 +18,13 @@ LIGHT_GRAY = 0.75, 0.75, 0.75
 WHITE = 1, 1, 1
 LEFT = 'L'
 RIGHT = 'R'
+SUM = 'Sum'
+MAX = 'Max'
+PRODUCT = 'Product'
+DIFFERENCE = 'Difference'
+AGGREGATIONS = SUM, MAX, PRODUCT, DIFFERENCE
+AGGREGATE = 'Aggregate'
+SCORES_DTYPE = np.float32
 
 #
 # SemiologyVisualization
@@ -51,6 +59,7 @@ class SemiologyVisualizationWidget(ScriptedLoadableModuleWidget):
     )
     self.makeGUI()
     self.parcellationLabelMapNode = None
+    self.scoresVolumeNode = None
     slicer.semiologyVisualization = self
 
   def makeGUI(self):
@@ -58,6 +67,8 @@ class SemiologyVisualizationWidget(ScriptedLoadableModuleWidget):
     self.makeSettingsButton()
     self.makeUpdateButton()
     self.makeSemiologiesButton()
+    self.makeComparisonButton()
+    self.makePlaybackButton()
 
     # Add vertical spacer
     self.layout.addStretch(1)
@@ -133,6 +144,92 @@ class SemiologyVisualizationWidget(ScriptedLoadableModuleWidget):
     semiologiesFormLayout = qt.QFormLayout(self.semiologiesCollapsibleButton)
     semiologiesFormLayout.addWidget(self.getSemiologiesWidget())
 
+  def makeComparisonButton(self):
+    self.comparisonFrames = None
+    self.comparisonCollapsibleButton = ctk.ctkCollapsibleButton()
+    self.comparisonCollapsibleButton.enabled = False
+    self.comparisonCollapsibleButton.text = 'Comparison'
+    self.comparisonCollapsibleButton.setChecked(False)
+    self.comparisonLayout = qt.QFormLayout(self.comparisonCollapsibleButton)
+    self.layout.addWidget(self.comparisonCollapsibleButton)
+
+    self.compareCheckBox = qt.QCheckBox()
+    self.compareCheckBox.toggled.connect(self.onCompareCheckBox)
+    self.comparisonLayout.addRow('Compare selections: ', self.compareCheckBox)
+
+    self.aggregationComboBox = qt.QComboBox()
+    self.aggregationComboBox.addItems(AGGREGATIONS)
+    self.aggregationComboBox.setToolTip(
+      'Sum and Max combine the scores of the selections.'
+      ' Product multiplies their likelihoods.'
+      ' Difference shows where the likelihood of the reference selection'
+      ' is higher than the likelihood of every other selection.'
+    )
+    self.aggregationComboBox.currentIndexChanged.connect(
+      self.onAggregationComboBox)
+    self.comparisonLayout.addRow('Aggregation: ', self.aggregationComboBox)
+
+    self.referenceComboBox = qt.QComboBox()
+    self.referenceComboBox.enabled = False
+    self.referenceComboBox.setToolTip(
+      'Selection compared against the others by the Difference aggregation')
+    self.referenceComboBox.currentIndexChanged.connect(
+      self.onAutoUpdateButton)
+    self.comparisonLayout.addRow('Reference: ', self.referenceComboBox)
+
+    self.componentComboBox = qt.QComboBox()
+    self.componentComboBox.currentIndexChanged.connect(
+      self.onComponentComboBox)
+    self.comparisonLayout.addRow('Show: ', self.componentComboBox)
+
+  def makePlaybackButton(self):
+    self.playbackSteps = []
+    self.playbackFrames = None
+    self.playbackFramesKey = None
+    self.playbackFrameIndex = 0
+    self.playbackTimer = qt.QTimer()
+    self.playbackTimer.timeout.connect(self.onPlaybackTimer)
+
+    self.playbackCollapsibleButton = ctk.ctkCollapsibleButton()
+    self.playbackCollapsibleButton.enabled = False
+    self.playbackCollapsibleButton.text = 'Playback'
+    self.playbackCollapsibleButton.setChecked(False)
+    self.playbackLayout = qt.QFormLayout(self.playbackCollapsibleButton)
+    self.layout.addWidget(self.playbackCollapsibleButton)
+
+    self.playbackStepsListWidget = qt.QListWidget()
+    self.playbackLayout.addRow('Steps: ', self.playbackStepsListWidget)
+
+    self.addStepButton = qt.QPushButton('Add selection')
+    self.addStepButton.clicked.connect(self.onAddStepButton)
+    self.clearStepsButton = qt.QPushButton('Clear')
+    self.clearStepsButton.clicked.connect(self.onClearStepsButton)
+    stepsButtonsLayout = qt.QHBoxLayout()
+    stepsButtonsLayout.addWidget(self.addStepButton)
+    stepsButtonsLayout.addWidget(self.clearStepsButton)
+    self.playbackLayout.addRow(stepsButtonsLayout)
+
+    self.inBetweenFramesSpinBox = qt.QSpinBox()
+    self.inBetweenFramesSpinBox.setRange(0, 30)
+    self.playbackLayout.addRow(
+      'In-between frames: ', self.inBetweenFramesSpinBox)
+
+    self.frameRateSpinBox = qt.QSpinBox()
+    self.frameRateSpinBox.setRange(1, 30)
+    self.frameRateSpinBox.setValue(2)
+    self.frameRateSpinBox.setSuffix(' fps')
+    self.playbackLayout.addRow('Frame rate: ', self.frameRateSpinBox)
+
+    self.playButton = qt.QPushButton('Play')
+    self.playButton.setCheckable(True)
+    self.playButton.toggled.connect(self.onPlayButton)
+    self.exportMovieButton = qt.QPushButton('Export movie')
+    self.exportMovieButton.clicked.connect(self.onExportMovieButton)
+    playbackButtonsLayout = qt.QHBoxLayout()
+    playbackButtonsLayout.addWidget(self.playButton)
+    playbackButtonsLayout.addWidget(self.exportMovieButton)
+    self.playbackLayout.addRow(playbackButtonsLayout)
+
   def makeLoadDataButton(self):
     self.loadDataButton = qt.QPushButton('Load data')
     self.loadDataButton.clicked.connect(self.onLoadDataButton)
@@ -190,33 +287,88 @@ class SemiologyVisualizationWidget(ScriptedLoadableModuleWidget):
     return colorNode
 
   def getScoresFromGUI(self):
-    from mega_analysis import get_scores_dict
     result = self.getSemiologyTermAndSideFromGUI()
     if result is None:
       slicer.util.messageBox('Please select a semiology')
       return
     else:
       semiologyTerm, symptomsSide = result
-    scoresDict = get_scores_dict(
-      semiology_term=semiologyTerm,
-      symptoms_side=symptomsSide,
-      dominant_hemisphere=self.getDominantHemisphereFromGUI(),
+    scoresDict = self.logic.getScoresDict(
+      semiologyTerm,
+      symptomsSide,
+      self.getDominantHemisphereFromGUI(),
     )
     return scoresDict
 
+  def getComparisonFramesFromGUI(self):
+    """Compute all the checked selections and aggregate their scores.
+
+    The aggregate is the first frame and each component is one of the
+    following frames, so that the component shown can be changed without
+    querying, aggregating or recoloring again.
+    """
+    selections = self.getSemiologyTermsAndSidesFromGUI()
+    if not selections:
+      slicer.util.messageBox('Please select a semiology')
+      return
+    colorNode = self.getColorNode()
+    if colorNode is None:
+      slicer.util.errorDisplay('No color node is selected')
+      return
+    selectionNames = [
+      f'{semiologyTerm} ({symptomsSide})'
+      for (semiologyTerm, symptomsSide) in selections
+    ]
+    referenceIndex = self.setComboBoxItems(
+      self.referenceComboBox, selectionNames)
+    scoresDicts = self.logic.getScoresDicts(
+      selections, self.getDominantHemisphereFromGUI())
+    labels, scoresMatrix = self.logic.getScoresMatrix(scoresDicts)
+    aggregatedScores = self.logic.aggregateScores(
+      scoresMatrix,
+      self.aggregationComboBox.currentText,
+      referenceIndex=referenceIndex,
+    )
+    frames = self.logic.getScoresFrames(
+      labels,
+      np.vstack((aggregatedScores, scoresMatrix)),
+      self.parcellation,
+      self.parcellationLabelMapNode,
+      colorNode,
+      showLeft=self.showLeftHemisphereCheckBox.isChecked(),
+      showRight=self.showRightHemisphereCheckBox.isChecked(),
+    )
+    self.setComboBoxItems(
+      self.componentComboBox, [AGGREGATE] + selectionNames)
+    return frames
+
+  def setComboBoxItems(self, comboBox, names):
+    """Repopulate a combo box, keeping the current item if possible."""
+    if comboBox.currentText in names:
+      index = names.index(comboBox.currentText)
+    elif 0 <= comboBox.currentIndex < len(names):
+      index = comboBox.currentIndex
+    else:
+      index = 0
+    comboBox.blockSignals(True)
+    comboBox.clear()
+    comboBox.addItems(names)
+    comboBox.setCurrentIndex(index)
+    comboBox.blockSignals(False)
+    return index
+
   def getSemiologyTermAndSideFromGUI(self):
+    selections = self.getSemiologyTermsAndSidesFromGUI()
+    return selections[0] if selections else None
+
+  def getSemiologyTermsAndSidesFromGUI(self):
+    selections = []
     for (semiologyTerm, widgetsDict) in self.semiologiesDict.items():
-      isLeft = widgetsDict['leftCheckBox'].isChecked()
-      isRight = widgetsDict['rightCheckBox'].isChecked()
-      if isLeft:
-        result = semiologyTerm, LEFT
-        break
-      elif isRight:
-        result = semiologyTerm, RIGHT
-        break
-    else:
-      result = None
-    return result
+      if widgetsDict['leftCheckBox'].isChecked():
+        selections.append((semiologyTerm, LEFT))
+      if widgetsDict['rightCheckBox'].isChecked():
+        selections.append((semiologyTerm, RIGHT))
+    return selections
 
   def getDominantHemisphereFromGUI(self):
     return LEFT if self.leftDominantRadioButton.isChecked() else RIGHT
@@ -229,19 +381,222 @@ class SemiologyVisualizationWidget(ScriptedLoadableModuleWidget):
   def onshowGifButton(self):
     self.parcellation.setOriginalColors()
 
+  def onCompareCheckBox(self):
+    compare = self.compareCheckBox.isChecked()
+    if not compare:
+      # Keep only the first selection when going back to a single semiology
+      selection = self.getSemiologyTermAndSideFromGUI()
+      for (semiologyTerm, widgetsDict) in self.semiologiesDict.items():
+        for (side, key) in ((LEFT, 'leftCheckBox'), (RIGHT, 'rightCheckBox')):
+          widgetsDict[key].blockSignals(True)
+          widgetsDict[key].setChecked((semiologyTerm, side) == selection)
+          widgetsDict[key].blockSignals(False)
+      self.comparisonFrames = None
+      self.setComboBoxItems(self.componentComboBox, [])
+      self.setComboBoxItems(self.referenceComboBox, [])
+    for widgetsDict in self.semiologiesDict.values():
+      widgetsDict['leftCheckBox'].setAutoExclusive(not compare)
+      widgetsDict['rightCheckBox'].setAutoExclusive(not compare)
+    self.onAutoUpdateButton()
+
+  def onAggregationComboBox(self):
+    isDifference = self.aggregationComboBox.currentText == DIFFERENCE
+    self.referenceComboBox.enabled = isDifference
+    self.onAutoUpdateButton()
+
+  def onComponentComboBox(self, index):
+    frames = self.comparisonFrames
+    if frames is None or not 0 <= index < len(frames):
+      return
+    if frames.isOutdated(self.parcellation):
+      self.updateColors()
+      return
+    self.showFrame(frames, index)
+
   def updateColors(self):
+    if self.compareCheckBox.isChecked():
+      self.comparisonFrames = self.getComparisonFramesFromGUI()
+      if self.comparisonFrames is None:
+        self.showScores(None)
+      else:
+        self.showFrame(
+          self.comparisonFrames, self.componentComboBox.currentIndex)
+    else:
+      self.showScores(self.getScoresFromGUI())
+
+  def hasScoresVolumeNode(self):
+    node = self.scoresVolumeNode
+    return node is not None and slicer.mrmlScene.IsNodePresent(node)
+
+  def showFrame(self, frames, frameIndex):
+    """Show precomputed scores without rebuilding the Scores volume."""
+    if not self.hasScoresVolumeNode():
+      self.scoresVolumeNode = self.logic.getScoresVolumeNode(
+        None, self.getColorNode(), self.parcellationLabelMapNode)
+      self.showScoresVolumeNode()
+    self.parcellation.setSegmentsColorsAndOpacities(
+      frames.colors[frameIndex],
+      opacities2D=frames.opacities2D[frameIndex],
+      opacities3D=frames.opacities3D[frameIndex],
+    )
+    self.logic.setScoresVolumeArray(
+      self.scoresVolumeNode,
+      frames.lookupTables[frameIndex],
+      frames.parcellationArray,
+      frames.windows[frameIndex],
+    )
+
+  def getPlaybackFrames(self):
+    """Precompute the frames of the sequence, or reuse the last ones."""
+    if not self.playbackSteps:
+      slicer.util.messageBox('Please add at least one step')
+      return
+    colorNode = self.getColorNode()
+    if colorNode is None:
+      slicer.util.errorDisplay('No color node is selected')
+      return
+    showLeft = self.showLeftHemisphereCheckBox.isChecked()
+    showRight = self.showRightHemisphereCheckBox.isChecked()
+    key = (
+      tuple(self.playbackSteps),
+      self.getDominantHemisphereFromGUI(),
+      self.inBetweenFramesSpinBox.value,
+      showLeft,
+      showRight,
+      colorNode.GetID(),
+    )
+    frames = self.playbackFrames
+    isOutdated = (
+      frames is None
+      or self.playbackFramesKey != key
+      or frames.isOutdated(self.parcellation)
+    )
+    if isOutdated:
+      self.playbackFrames = self.logic.getPlaybackFrames(
+        self.playbackSteps,
+        self.getDominantHemisphereFromGUI(),
+        self.parcellation,
+        self.parcellationLabelMapNode,
+        colorNode,
+        numInBetweenFrames=self.inBetweenFramesSpinBox.value,
+        showLeft=showLeft,
+        showRight=showRight,
+      )
+      self.playbackFramesKey = key
+    return self.playbackFrames
+
+  def startPlayback(self):
+    frames = self.getPlaybackFrames()
+    if frames is None:
+      return False
+    # The timer shows the following frames
+    self.showFrame(frames, 0)
+    self.playbackFrameIndex = 1
+    return True
+
+  def onAddStepButton(self):
+    selections = self.getSemiologyTermsAndSidesFromGUI()
+    if not selections:
+      slicer.util.messageBox('Please select a semiology')
+      return
+    for (semiologyTerm, symptomsSide) in selections:
+      self.playbackSteps.append((semiologyTerm, symptomsSide))
+      self.playbackStepsListWidget.addItem(
+        f'{semiologyTerm} ({symptomsSide})')
+
+  def onClearStepsButton(self):
+    self.playButton.setChecked(False)
+    self.playbackSteps = []
+    self.playbackStepsListWidget.clear()
+
+  def onPlayButton(self, checked):
+    if not checked:
+      self.playbackTimer.stop()
+      self.playButton.text = 'Play'
+      return
+    if not self.startPlayback():
+      self.playButton.setChecked(False)
+      return
+    self.playButton.text = 'Stop'
+    self.playbackTimer.setInterval(int(1000 / self.frameRateSpinBox.value))
+    self.playbackTimer.start()
+
+  def onPlaybackTimer(self):
+    frames = self.playbackFrames
+    if frames.isOutdated(self.parcellation):
+      logging.warning('Segments changed during playback. Stopping')
+      self.playButton.setChecked(False)
+      return
+    if self.playbackFrameIndex >= len(frames):
+      self.playButton.setChecked(False)
+      return
+    self.showFrame(frames, self.playbackFrameIndex)
+    self.playbackFrameIndex += 1
+
+  def onExportMovieButton(self):
+    import ScreenCapture
+    captureLogic = ScreenCapture.ScreenCaptureLogic()
+    if not captureLogic.isFfmpegPathValid():
+      slicer.util.errorDisplay(
+        'FFmpeg is needed to export movies. Please set it up in the'
+        ' Screen Capture module')
+      return
+    threeDWidget = slicer.app.layoutManager().threeDWidget(0)
+    if threeDWidget is None:
+      slicer.util.errorDisplay(
+        'A 3D view is needed to export movies. Please choose a layout'
+        ' with a 3D view')
+      return
+    view = threeDWidget.threeDView()
+    videoPath = qt.QFileDialog.getSaveFileName(
+      None, 'Export movie', 'semiology.mp4', 'Videos (*.mp4)')
+    if not videoPath:
+      return
+    self.playButton.setChecked(False)
+    if not self.startPlayback():
+      return
+    numFrames = len(self.playbackFrames)
+    progressDialog = slicer.util.createProgressDialog(
+      value=0,
+      maximum=numFrames,
+      windowTitle='Exporting movie...',
+    )
+    imagePattern = 'frame_%05d.png'
+    try:
+      with tempfile.TemporaryDirectory() as framesDir:
+        for frameIndex in range(numFrames):
+          progressDialog.setValue(frameIndex)
+          self.showFrame(self.playbackFrames, frameIndex)
+          slicer.app.processEvents()
+          view.forceRender()
+          framePath = Path(framesDir) / (imagePattern % frameIndex)
+          captureLogic.captureImageFromView(view, str(framePath))
+        captureLogic.createVideo(
+          self.frameRateSpinBox.value,
+          '-codec libx264 -preset slower -pix_fmt yuv420p',
+          framesDir,
+          imagePattern,
+          videoPath,
+        )
+    except Exception as e:
+      slicer.util.errorDisplay(f'The movie could not be exported:\n\n{e}')
+    finally:
+      progressDialog.close()
+
+  def showScores(self, scoresDict):
     colorNode = self.getColorNode()
     if colorNode is None:
       slicer.util.errorDisplay('No color node is selected')
       return
-    scoresDict = self.getScoresFromGUI()
     self.scoresVolumeNode = self.logic.getScoresVolumeNode(
       scoresDict, colorNode, self.parcellationLabelMapNode)
     showLeft = self.showLeftHemisphereCheckBox.isChecked()
     showRight = self.showRightHemisphereCheckBox.isChecked()
     self.parcellation.setScoresColors(
       scoresDict, colorNode, showLeft=showLeft, showRight=showRight)
+    self.showScoresVolumeNode()
 
+  def showScoresVolumeNode(self):
     slicer.util.setSliceViewerLayers(
       foreground=self.scoresVolumeNode,
       foregroundOpacity=0,
@@ -278,16 +633,197 @@ class SemiologyVisualizationWidget(ScriptedLoadableModuleWidget):
     self.parcellation.load()
     self.semiologiesCollapsibleButton.enabled = True
     self.settingsCollapsibleButton.enabled = True
+    self.comparisonCollapsibleButton.enabled = True
+    self.playbackCollapsibleButton.enabled = True
 
   def onAutoUpdateCheckBox(self):
     self.updateButton.setDisabled(self.autoUpdateCheckBox.isChecked())
 
+  def cleanup(self):
+    self.playbackTimer.stop()
+    self.parcellation.removeSegmentationObservers()
+
 
 #
 # SemiologyVisualizationLogic
 #
 class SemiologyVisualizationLogic(ScriptedLoadableModuleLogic):
 
+  def __init__(self):
+    ScriptedLoadableModuleLogic.__init__(self)
+    self.scoresCache = {}
+
+  def getScoresDict(self, semiologyTerm, symptomsSide, dominantHemisphere):
+    key = semiologyTerm, symptomsSide, dominantHemisphere
+    if key not in self.scoresCache:
+      from mega_analysis import get_scores_dict
+      self.scoresCache[key] = get_scores_dict(
+        semiology_term=semiologyTerm,
+        symptoms_side=symptomsSide,
+        dominant_hemisphere=dominantHemisphere,
+      )
+    return self.scoresCache[key]
+
+  def getScoresDicts(self, selections, dominantHemisphere):
+    return [
+      self.getScoresDict(semiologyTerm, symptomsSide, dominantHemisphere)
+      for (semiologyTerm, symptomsSide) in selections
+    ]
+
+  def getScoresMatrix(self, scoresDicts):
+    """Stack scores dictionaries into an array of shape (N, L).
+
+    L is the number of labels present in any of the N dictionaries. The
+    returned labels are sorted. Missing labels get a score of 0.
+    """
+    scoresDicts = [{} if d is None else d for d in scoresDicts]
+    labels = sorted({int(label) for d in scoresDicts for label in d})
+    labels = np.array(labels, dtype=int)
+    scoresMatrix = np.zeros((len(scoresDicts), len(labels)))
+    for row, scoresDict in enumerate(scoresDicts):
+      if not scoresDict:
+        continue
+      rowLabels = np.array([int(label) for label in scoresDict])
+      rowScores = np.array([float(s) for s in scoresDict.values()])
+      columns = np.searchsorted(labels, rowLabels)
+      scoresMatrix[row, columns] = rowScores
+    return labels, scoresMatrix
+
+  def aggregateScores(self, scoresMatrix, method, referenceIndex=0):
+    """Aggregate the rows of a scores matrix.
+
+    Sum and Max work on the raw scores. Product and Difference work on
+    likelihoods (scores normalized so that each row sums to 1) and are
+    rescaled to [0, 100]. Difference is the reference row minus the
+    maximum of the other rows, clipped to 0.
+    """
+    if method == SUM:
+      scores = scoresMatrix.sum(axis=0)
+    elif method == MAX:
+      scores = scoresMatrix.max(axis=0)
+    elif method in (PRODUCT, DIFFERENCE):
+      sums = scoresMatrix.sum(axis=1, keepdims=True)
+      sums[sums == 0] = 1
+      likelihoods = scoresMatrix / sums
+      if method == PRODUCT:
+        scores = likelihoods.prod(axis=0)
+      elif len(likelihoods) > 1:
+        others = np.delete(likelihoods, referenceIndex, axis=0)
+        scores = likelihoods[referenceIndex] - others.max(axis=0)
+        scores = np.clip(scores, 0, None)
+      else:
+        scores = likelihoods[0]
+      if scores.any():
+        scores = 100 * scores / scores.max()
+    else:
+      raise ValueError(f'Aggregation method not recognized: {method}')
+    return scores
+
+  def interpolateScores(self, scoresMatrix, numInBetweenFrames):
+    """Insert linearly interpolated rows between consecutive rows."""
+    if numInBetweenFrames < 1 or len(scoresMatrix) < 2:
+      return scoresMatrix.copy()
+    numLabels = scoresMatrix.shape[1]
+    weights = np.arange(numInBetweenFrames + 1) / (numInBetweenFrames + 1)
+    starts = scoresMatrix[:-1, np.newaxis]
+    differences = np.diff(scoresMatrix, axis=0)[:, np.newaxis]
+    frames = starts + weights[np.newaxis, :, np.newaxis] * differences
+    frames = frames.reshape(-1, numLabels)
+    return np.vstack((frames, scoresMatrix[-1:]))
+
+  def getPlaybackFrames(
+      self,
+      steps,
+      dominantHemisphere,
+      parcellation,
+      parcellationLabelMapNode,
+      colorNode,
+      numInBetweenFrames=0,
+      showLeft=True,
+      showRight=True,
+      ):
+    scoresDicts = self.getScoresDicts(steps, dominantHemisphere)
+    labels, scoresMatrix = self.getScoresMatrix(scoresDicts)
+    framesScores = self.interpolateScores(scoresMatrix, numInBetweenFrames)
+    return self.getScoresFrames(
+      labels,
+      framesScores,
+      parcellation,
+      parcellationLabelMapNode,
+      colorNode,
+      showLeft=showLeft,
+      showRight=showRight,
+    )
+
+  def getScoresFrames(
+      self,
+      labels,
+      scoresMatrix,
+      parcellation,
+      parcellationLabelMapNode,
+      colorNode,
+      showLeft=True,
+      showRight=True,
+      ):
+    """Precompute what is needed to show each row of a scores matrix."""
+    parcellationArray = slicer.util.arrayFromVolume(parcellationLabelMapNode)
+    # Single pass over the label map, shared by all frames
+    presentLabels = np.unique(parcellationArray)
+    lookupTables = self.getScoresLookupTables(
+      labels, scoresMatrix, presentLabels[-1] + 1)
+    windows = self.getScoresWindows(lookupTables[:, presentLabels])
+    colors, opacities2D, opacities3D = parcellation.getScoresColorsAndOpacities(
+      labels,
+      scoresMatrix,
+      colorNode,
+      showLeft=showLeft,
+      showRight=showRight,
+    )
+    return ScoresFrames(
+      lookupTables,
+      windows,
+      colors,
+      opacities2D,
+      opacities3D,
+      parcellationArray,
+      parcellation.segmentsIndex,
+    )
+
+  def getScoresLookupTables(self, labels, scoresMatrix, numLabels):
+    """Return an array of shape (N, numLabels) mapping labels to scores."""
+    lookupTables = np.zeros((len(scoresMatrix), numLabels), dtype=SCORES_DTYPE)
+    isValid = (labels >= 0) & (labels < numLabels)
+    lookupTables[:, labels[isValid]] = scoresMatrix[:, isValid]
+    return lookupTables
+
+  def getScoresWindows(self, scoresMatrix):
+    """Return the minimum positive score and the maximum score per row."""
+    isPositive = scoresMatrix > 0
+    minScores = np.where(isPositive, scoresMatrix, np.inf).min(
+      axis=1, initial=np.inf)
+    maxScores = np.where(isPositive, scoresMatrix, 0).max(axis=1, initial=0)
+    minScores[~isPositive.any(axis=1)] = 0
+    return np.stack((minScores, maxScores), axis=1)
+
+  def setScoresVolumeArray(
+      self,
+      scoresVolumeNode,
+      lookupTable,
+      parcellationArray,
+      window,
+      ):
+    """Overwrite the voxels of an existing Scores volume in place."""
+    scoresArray = slicer.util.arrayFromVolume(scoresVolumeNode)
+    scoresArray[:] = lookupTable[parcellationArray]
+    slicer.util.arrayFromVolumeModified(scoresVolumeNode)
+    self.setScoresWindow(scoresVolumeNode.GetDisplayNode(), window)
+
+  def setScoresWindow(self, displayNode, window):
+    windowMin, windowMax = window
+    # Fractional scores must not be hidden by the threshold
+    displayNode.SetLowerThreshold(windowMin if windowMin > 0 else 1)
+    displayNode.SetWindowLevelMinMax(windowMin, windowMax)
+
   def getSemiologiesDict(self, semiologies, slot):
     semiologiesDict = {}
     for semiology in semiologies:
@@ -362,27 +898,27 @@ class SemiologyVisualizationLogic(ScriptedLoadableModuleLogic):
   def getScoresVolumeNode(self, scoresDict, colorNode, parcellationLabelMapNode):
     parcellationImage = su.PullVolumeFromSlicer(parcellationLabelMapNode)
     parcellationArray = sitk.GetArrayViewFromImage(parcellationImage)
-    scoresArray = np.zeros_like(parcellationArray)
 
-    if scoresDict is not None:
-      for (label, score) in scoresDict.items():
-        label = int(label)
-        score = float(score)
-        labelMask = parcellationArray == label
-        scoresArray[labelMask] = score
+    # Use a lookup table instead of one mask per label. Scores can be larger
+    # than the label map type allows, or fractional
+    labels, scoresMatrix = self.getScoresMatrix([scoresDict])
+    lookupTable, = self.getScoresLookupTables(
+      labels, scoresMatrix, parcellationArray.max() + 1)
+    scoresArray = lookupTable[parcellationArray]
 
     scoresImage = self.getImageFromArray(scoresArray, parcellationImage)
     scoresName = 'Scores'
-    scoresVolumeNode = su.PushVolumeToSlicer(scoresImage, name=scoresName)
+    scoresVolumeNode = slicer.util.getFirstNodeByClassByName(
+      'vtkMRMLScalarVolumeNode', scoresName)
+    scoresVolumeNode = su.PushVolumeToSlicer(
+      scoresImage, targetNode=scoresVolumeNode, name=scoresName)
     displayNode = scoresVolumeNode.GetDisplayNode()
     displayNode.SetAutoThreshold(False)
     displayNode.SetAndObserveColorNodeID(colorNode.GetID())
-    displayNode.SetLowerThreshold(1)
     displayNode.ApplyThresholdOn()
     displayNode.SetAutoWindowLevel(False)
-    windowMin = scoresArray[scoresArray > 0].min() if scoresArray.any() else 0
-    windowMax = scoresArray.max()
-    displayNode.SetWindowLevelMinMax(windowMin, windowMax)
+    window, = self.getScoresWindows(lookupTable[np.unique(parcellationArray)])
+    self.setScoresWindow(displayNode, window)
     return scoresVolumeNode
 
   def getImageFromArray(self, array, referenceImage):
@@ -435,6 +971,12 @@ class SemiologyVisualizationTest(ScriptedLoadableModuleTest):
     """Run as few or as many tests as needed here.
     """
     self.setUp()
+    self.test_getScoresMatrix()
+    self.test_aggregateScores()
+    self.test_aggregateScoresEmpty()
+    self.test_getScoresLookupTables()
+    self.test_getScoresWindows()
+    self.test_interpolateScores()
     self.test_SemiologyVisualization1()
 
   def test_SemiologyVisualization1(self):
@@ -466,12 +1008,101 @@ class SemiologyVisualizationTest(ScriptedLoadableModuleTest):
     self.assertIsNotNone( logic.hasImageData(volumeNode) )
     self.delayDisplay('Test passed!')
 
+  def test_getScoresMatrix(self):
+    logic = SemiologyVisualizationLogic()
+    scoresDicts = [{1: 2, 3: 4}, {3: 1, 5: 6}, None]
+    labels, scoresMatrix = logic.getScoresMatrix(scoresDicts)
+    np.testing.assert_array_equal(labels, [1, 3, 5])
+    np.testing.assert_array_equal(
+      scoresMatrix,
+      [[2, 4, 0], [0, 1, 6], [0, 0, 0]],
+    )
+
+  def test_aggregateScores(self):
+    logic = SemiologyVisualizationLogic()
+    scoresMatrix = np.array([[1., 3., 0.], [3., 1., 4.]])
+    np.testing.assert_array_equal(
+      logic.aggregateScores(scoresMatrix, SUM), [4, 4, 4])
+    np.testing.assert_array_equal(
+      logic.aggregateScores(scoresMatrix, MAX), [3, 3, 4])
+    # Likelihoods are [0.25, 0.75, 0] and [0.375, 0.125, 0.5]
+    np.testing.assert_allclose(
+      logic.aggregateScores(scoresMatrix, PRODUCT), [100, 100, 0])
+    np.testing.assert_allclose(
+      logic.aggregateScores(scoresMatrix, DIFFERENCE), [0, 100, 0])
+    np.testing.assert_allclose(
+      logic.aggregateScores(scoresMatrix, DIFFERENCE, referenceIndex=1),
+      [25, 0, 100],
+    )
+    with self.assertRaises(ValueError):
+      logic.aggregateScores(scoresMatrix, 'Mean')
+
+  def test_aggregateScoresEmpty(self):
+    logic = SemiologyVisualizationLogic()
+    # Selections that do not overlap
+    scoresMatrix = np.array([[1., 0.], [0., 1.]])
+    np.testing.assert_array_equal(
+      logic.aggregateScores(scoresMatrix, PRODUCT), [0, 0])
+    # A single selection is aggregated to itself
+    scoresMatrix = np.array([[1., 3.]])
+    for method in (SUM, MAX):
+      np.testing.assert_array_equal(
+        logic.aggregateScores(scoresMatrix, method), [1, 3])
+    for method in (PRODUCT, DIFFERENCE):
+      np.testing.assert_allclose(
+        logic.aggregateScores(scoresMatrix, method), [100 / 3, 100])
+    # No labels at all
+    scoresMatrix = np.zeros((2, 0))
+    for method in AGGREGATIONS:
+      self.assertEqual(logic.aggregateScores(scoresMatrix, method).size, 0)
+
+  def test_getScoresLookupTables(self):
+    logic = SemiologyVisualizationLogic()
+    labels = np.array([1, 3, 7])
+    scoresMatrix = np.array([[300.5, 0.25, 1.], [0., 2., 3.]])
+    lookupTables = logic.getScoresLookupTables(labels, scoresMatrix, 5)
+    self.assertEqual(lookupTables.dtype, SCORES_DTYPE)
+    # Label 7 is not in the label map
+    np.testing.assert_array_equal(
+      lookupTables,
+      [[0, 300.5, 0, 0.25, 0], [0, 0, 0, 2, 0]],
+    )
+
+  def test_getScoresWindows(self):
+    logic = SemiologyVisualizationLogic()
+    scoresMatrix = np.array([[0., 0.25, 300.5], [0., 0., 0.]])
+    np.testing.assert_array_equal(
+      logic.getScoresWindows(scoresMatrix),
+      [[0.25, 300.5], [0, 0]],
+    )
+
+  def test_interpolateScores(self):
+    logic = SemiologyVisualizationLogic()
+    scoresMatrix = np.array([[0., 4.], [4., 0.], [4., 4.]])
+    np.testing.assert_array_equal(
+      logic.interpolateScores(scoresMatrix, 0), scoresMatrix)
+    np.testing.assert_array_equal(
+      logic.interpolateScores(scoresMatrix, 1),
+      [[0, 4], [2, 2], [4, 0], [4, 2], [4, 4]],
+    )
+    frames = logic.interpolateScores(scoresMatrix, 3)
+    self.assertEqual(frames.shape, (9, 2))
+    np.testing.assert_array_equal(frames[::4], scoresMatrix)
+    np.testing.assert_array_equal(frames[:5, 0], [0, 1, 2, 3, 4])
+    # A single step has nothing to interpolate
+    np.testing.assert_array_equal(
+      logic.interpolateScores(scoresMatrix[:1], 3), scoresMatrix[:1])
+
 
 class Parcellation(ABC):
   def __init__(self, segmentationPath):
     self.segmentationPath = Path(segmentationPath)
     self.segmentationNode = None
     self._labelMap = None
+    self._segmentsIndex = None
+    self._observedSegmentation = None
+    self._observerTags = []
+    self._applyingColors = False
 
   # @property
   # def label_map(self):
@@ -500,8 +1131,50 @@ class Parcellation(ABC):
     ]
     return segmentIDs
 
-  def getSegments(self):
-    return [self.segmentation.GetSegment(x) for x in self.getSegmentIDs()]
+  @property
+  def segmentsIndex(self):
+    if self._segmentsIndex is None:
+      self._segmentsIndex = SegmentsIndex(self)
+    return self._segmentsIndex
+
+  def observeSegmentation(self):
+    """Invalidate the segments index when segments change or are renamed."""
+    self.removeSegmentationObservers()
+    self._observedSegmentation = self.segmentation
+    events = (
+      slicer.vtkSegmentation.SegmentAdded,
+      slicer.vtkSegmentation.SegmentRemoved,
+      slicer.vtkSegmentation.SegmentsOrderModified,
+    )
+    for event in events:
+      tag = self._observedSegmentation.AddObserver(
+        event, self.onSegmentationStructureModified)
+      self._observerTags.append(tag)
+    tag = self._observedSegmentation.AddObserver(
+      slicer.vtkSegmentation.SegmentModified, self.onSegmentModified)
+    self._observerTags.append(tag)
+
+  def removeSegmentationObservers(self):
+    if self._observedSegmentation is not None:
+      for tag in self._observerTags:
+        self._observedSegmentation.RemoveObserver(tag)
+    self._observedSegmentation = None
+    self._observerTags = []
+
+  def onSegmentationStructureModified(self, caller=None, event=None):
+    self._segmentsIndex = None
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onSegmentModified(self, caller, event, segmentID):
+    # Setting colors emits this event for every segment, but only renames
+    # can make the index outdated
+    if self._applyingColors or self._segmentsIndex is None:
+      return
+    segment = caller.GetSegment(segmentID)
+    if segment is None:
+      return
+    if self._segmentsIndex.isNameOutdated(segmentID, segment.GetName()):
+      self._segmentsIndex = None
 
   def load(self):
     stem = self.segmentationPath.name.split('.')[0]
@@ -513,6 +1186,8 @@ class Parcellation(ABC):
       node = slicer.util.loadSegmentation(str(self.segmentationPath))
     self.segmentationNode = node
     self.segmentationNode.GetDisplayNode().SetOpacity2DFill(1)
+    self.observeSegmentation()
+    self._segmentsIndex = SegmentsIndex(self)
 
   def isValidNumber(self, number):
     return self.colorTable.isValidNumber(number)
@@ -520,34 +1195,17 @@ class Parcellation(ABC):
   def getColorFromName(self, name):
     return self.colorTable.getColorFromName(name)
 
-  def getColorFromSegment(self, segment):
-    return self.getColorFromName(segment.GetName())
-
   def getLabelFromName(self, name):
     return self.colorTable.getLabelFromName(name)
 
-  def getLabelFromSegment(self, segment):
-    return self.getLabelFromName(segment.GetName())
-
   def setOriginalColors(self):
-    segments = self.getSegments()
-    numSegments = len(segments)
-    progressDialog = slicer.util.createProgressDialog(
-      value=0,
-      maximum=numSegments,
-      windowTitle='Setting colors...',
+    index = self.segmentsIndex
+    numSegments = len(index)
+    self.setSegmentsColorsAndOpacities(
+      index.originalColors,
+      opacities2D=np.ones(numSegments),
+      opacities3D=np.ones(numSegments),
     )
-    for i, segment in enumerate(segments):
-      progressDialog.setValue(i)
-      progressDialog.setLabelText(segment.GetName())
-      slicer.app.processEvents()
-      color = self.getColorFromSegment(segment)
-      segment.SetColor(color)
-      self.setSegmentOpacity(segment, 1, dimension=2)
-      self.setSegmentOpacity(segment, 1, dimension=3)
-    progressDialog.setValue(numSegments)
-    slicer.app.processEvents()
-    progressDialog.close()
 
   def setScoresColors(
       self,
@@ -556,82 +1214,120 @@ class Parcellation(ABC):
       showLeft=True,
       showRight=True,
       ):
-    segments = self.getSegments()
-    numSegments = len(segments)
-    progressDialog = slicer.util.createProgressDialog(
-      value=0,
-      maximum=numSegments,
-      windowTitle='Setting colors...',
-    )
-    for i, segment in enumerate(segments):
-      progressDialog.setValue(i)
-      progressDialog.setLabelText(segment.GetName())
-      slicer.app.processEvents()
-      label = self.getLabelFromSegment(segment)
-      if scoresDict is not None:
-        scores = np.array(list(scoresDict.values()))
-        scores = scores[scores > 0]  # do I want this?
-        minScore = min(scores)
-        maxScore = max(scores)
-      color = LIGHT_GRAY
-      opacity2D = 0
-      opacity3D = 1
-      if scoresDict is not None and label in scoresDict:
-        score = scoresDict[label]
-        if score > 0:
-          opacity2D = 1
-          opacity3D = 1
-          score -= minScore
-          score /= maxScore
-          color = self.getColorFromScore(score, colorNode)
-      if not showLeft and 'Left' in segment.GetName():
-        opacity3D = 0
-      if not showRight and 'Right' in segment.GetName():
-        opacity3D = 0
-      segment.SetColor(color)
-      self.setSegmentOpacity(segment, opacity2D, dimension=2)
-      self.setSegmentOpacity(segment, opacity3D, dimension=3)
-    progressDialog.setValue(numSegments)
-    slicer.app.processEvents()
-    progressDialog.close()
-
-  def getColorFromScore(self, normalizedScore, colorNode):
-    """This method is very important"""
+    scoresDict = {} if scoresDict is None else scoresDict
+    items = sorted((int(label), float(s)) for (label, s) in scoresDict.items())
+    labels = np.array([label for (label, _) in items], dtype=int)
+    scoresMatrix = np.array([[score for (_, score) in items]])
+    colors, opacities2D, opacities3D = self.getScoresColorsAndOpacities(
+      labels, scoresMatrix, colorNode, showLeft=showLeft, showRight=showRight)
+    self.setSegmentsColorsAndOpacities(
+      colors[0], opacities2D=opacities2D[0], opacities3D=opacities3D[0])
+
+  def getScoresColorsAndOpacities(
+      self,
+      labels,
+      scoresMatrix,
+      colorNode,
+      showLeft=True,
+      showRight=True,
+      ):
+    """Compute the segments colors for each row of a scores matrix.
+
+    scoresMatrix has shape (N, L), with one column per label in the sorted
+    array labels. The returned colors have shape (N, S, 3) and the
+    opacities (N, S), aligned with the segments index.
+    """
+    index = self.segmentsIndex
+    segmentsScores = self.getSegmentsScores(labels, scoresMatrix)
+    numFrames, numSegments = segmentsScores.shape
+
+    # Each row is normalized by its own positive scores
+    isPositive = scoresMatrix > 0
+    minScores = np.where(isPositive, scoresMatrix, np.inf).min(
+      axis=1, initial=np.inf)
+    maxScores = np.where(isPositive, scoresMatrix, 0).max(axis=1, initial=0)
+    hasScores = isPositive.any(axis=1)
+    minScores[~hasScores] = 0
+    maxScores[~hasScores] = 1
+    normalizedScores = segmentsScores - minScores[:, np.newaxis]
+    normalizedScores /= maxScores[:, np.newaxis]
+
+    hasScore = segmentsScores > 0
+    colors = np.empty((numFrames, numSegments, 3))
+    colors[:] = LIGHT_GRAY
+    colors[hasScore] = self.getColorsFromScores(
+      normalizedScores[hasScore], colorNode)
+    opacities2D = hasScore.astype(float)
+    opacities3D = np.ones((numFrames, numSegments))
+    if not showLeft:
+      opacities3D[:, index.isLeft] = 0
+    if not showRight:
+      opacities3D[:, index.isRight] = 0
+    return colors, opacities2D, opacities3D
+
+  def getSegmentsScores(self, labels, scoresMatrix):
+    """Select the columns of a scores matrix that correspond to segments."""
+    segmentLabels = self.segmentsIndex.labels
+    segmentsScores = np.zeros((len(scoresMatrix), len(segmentLabels)))
+    if len(labels):
+      columns = np.searchsorted(labels, segmentLabels)
+      columns = np.clip(columns, 0, len(labels) - 1)
+      isScored = labels[columns] == segmentLabels
+      segmentsScores[:, isScored] = scoresMatrix[:, columns[isScored]]
+    return segmentsScores
+
+  def getColorsFromScores(self, normalizedScores, colorNode):
+    """Map scores in [0, 1] to colors of the color node"""
+    lookupTable = self.getColorLookupTable(colorNode)
+    numColors = len(lookupTable)
+    scoreIndices = ((numColors - 1) * normalizedScores).astype(int)
+    scoreIndices = np.clip(scoreIndices, 0, numColors - 1)
+    return lookupTable[scoreIndices]
+
+  def getColorLookupTable(self, colorNode):
     numColors = colorNode.GetNumberOfColors()
-    scoreIndex = int((numColors - 1) * normalizedScore)
+    lookupTable = np.empty((numColors, 3))
     colorAlpha = 4 * [0]
-    colorNode.GetColor(scoreIndex, colorAlpha)
-    color = np.array(colorAlpha[:3])
-    return color
+    for i in range(numColors):
+      colorNode.GetColor(i, colorAlpha)
+      lookupTable[i] = colorAlpha[:3]
+    return lookupTable
 
   def setRandomColors(self):
     """For debugging purposes"""
-    segments = self.getSegments()
-    numSegments = len(segments)
-    progressDialog = slicer.util.createProgressDialog(
-        value=0,
-        maximum=numSegments,
-        windowTitle='Setting colors...',
-    )
-    for i, segment in enumerate(segments):
-      progressDialog.setValue(i)
-      slicer.app.processEvents()
-      color = self.getRandomColor()
-      segment.SetColor(color)
-    progressDialog.setValue(numSegments)
-    slicer.app.processEvents()
-    progressDialog.close()
+    numSegments = len(self.segmentsIndex)
+    colors = np.array([self.getRandomColor() for _ in range(numSegments)])
+    self.setSegmentsColorsAndOpacities(colors)
 
   def getRandomColor(self, normalized=True):
     return np.random.rand(3)
 
-  def setSegmentOpacity(self, segment, opacity, dimension):
-    displayNode = self.segmentationNode.GetDisplayNode()
-    if dimension == 2:
-      displayNode.SetSegmentOpacity2DFill(segment.GetName(), opacity)
-      displayNode.SetSegmentOpacity2DOutline(segment.GetName(), opacity)
-    elif dimension == 3:
-      displayNode.SetSegmentOpacity3D(segment.GetName(), opacity)
+  def setSegmentsColorsAndOpacities(
+      self,
+      colors,
+      opacities2D=None,
+      opacities3D=None,
+      ):
+    """Apply arrays aligned with the segments index in a single batch."""
+    index = self.segmentsIndex
+    displayNode = index.displayNode
+    wasModifying = self.segmentationNode.StartModify()
+    wasModifyingDisplay = displayNode.StartModify()
+    self._applyingColors = True
+    try:
+      iterable = enumerate(zip(index.segmentIDs, index.segments))
+      for i, (segmentID, segment) in iterable:
+        segment.SetColor(colors[i])
+        if opacities2D is not None:
+          opacity = float(opacities2D[i])
+          displayNode.SetSegmentOpacity2DFill(segmentID, opacity)
+          displayNode.SetSegmentOpacity2DOutline(segmentID, opacity)
+        if opacities3D is not None:
+          displayNode.SetSegmentOpacity3D(segmentID, float(opacities3D[i]))
+    finally:
+      self._applyingColors = False
+      displayNode.EndModify(wasModifyingDisplay)
+      self.segmentationNode.EndModify(wasModifying)
 
 
 class GIFParcellation(Parcellation):
@@ -645,8 +1341,71 @@ class GIFParcellation(Parcellation):
     return self._colorTable
 
   def load(self):
-    super().load()
+    # The color table is needed to build the segments index
     self._colorTable = GIFColorTable(self.colorTablePath)
+    super().load()
+
+
+class SegmentsIndex:
+  """Segment handles and properties, aligned and fetched only once.
+
+  The parcellation discards its index when the segmentation reports that
+  segments have been added, removed, reordered or renamed, as labels and
+  hemispheres are derived from the names.
+  """
+  def __init__(self, parcellation):
+    self.segmentIDs = parcellation.getSegmentIDs()
+    self.segments = [
+      parcellation.segmentation.GetSegment(segmentID)
+      for segmentID in self.segmentIDs
+    ]
+    names = [segment.GetName() for segment in self.segments]
+    self.namesByID = dict(zip(self.segmentIDs, names))
+    self.labels = np.array(
+      [parcellation.getLabelFromName(name) for name in names], dtype=int)
+    self.originalColors = np.array(
+      [parcellation.getColorFromName(name) for name in names])
+    self.isLeft = np.array(['Left' in name for name in names], dtype=bool)
+    self.isRight = np.array(['Right' in name for name in names], dtype=bool)
+    self.displayNode = parcellation.segmentationNode.GetDisplayNode()
+
+  def __len__(self):
+    return len(self.segmentIDs)
+
+  def isNameOutdated(self, segmentID, name):
+    return self.namesByID.get(segmentID) != name
+
+
+class ScoresFrames:
+  """Segment colors and Scores lookup tables of a list of scores maps.
+
+  Everything needed to show a frame is precomputed, so that showing it only
+  copies arrays into the segmentation and the Scores volume.
+  """
+  def __init__(
+      self,
+      lookupTables,
+      windows,
+      colors,
+      opacities2D,
+      opacities3D,
+      parcellationArray,
+      segmentsIndex,
+      ):
+    self.lookupTables = lookupTables
+    self.windows = windows
+    self.colors = colors
+    self.opacities2D = opacities2D
+    self.opacities3D = opacities3D
+    self.parcellationArray = parcellationArray
+    # Colors and opacities are aligned with this index
+    self.segmentsIndex = segmentsIndex
+
+  def __len__(self):
+    return len(self.lookupTables)
+
+  def isOutdated(self, parcellation):
+    return self.segmentsIndex is not parcellation.segmentsIndex
 
 
 class ColorTable(ABC):